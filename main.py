@@ -2,6 +2,18 @@ import pygame
 import sys
 import random
 import math
+import argparse
+import time
+import os
+import struct
+import atexit
+import weakref
+import threading
+import queue
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from bisect import bisect_left, bisect_right
 
 pygame.init()
 
@@ -26,10 +38,103 @@ DARK_GRAY = (64, 64, 64)
 GOLD = (255, 215, 0)
 PINK = (255, 192, 203)
 
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Super Daniel Jaccosy")
+# Order in which a frame's player contacts are resolved: everything that can hurt
+# the player first, so a hit resets the level before any pickups from the same
+# frame are counted.
+CONTACT_ORDER = {"enemy": 0, "projectile": 1, "boss": 2, "powerup": 3, "coin": 4, "flag": 5}
+PLAYER_CONTACTS = [("player", kind) for kind in CONTACT_ORDER if kind != "coin"]
+
+screen = None
 clock = pygame.time.Clock()
 
+# Live pixel memory by owning class. Surfaces made through tracked_surface are
+# counted until they are garbage collected; after every level load the total is
+# recorded per level, and a level whose total keeps growing across loads is
+# reported as a likely leak.
+class SurfaceTracker:
+    LEAK_LOADS = 3
+
+    def __init__(self):
+        self.owners = {}
+        self.current = 0
+        self.peak = 0
+        self.loads = {}
+        self.leaks = {}
+
+    def track(self, owner, surface):
+        size = surface.get_pitch() * surface.get_height()
+        count, total = self.owners.get(owner, (0, 0))
+        self.owners[owner] = (count + 1, total + size)
+        self.current += size
+        self.peak = max(self.peak, self.current)
+        weakref.finalize(surface, self.release, owner, size).atexit = False
+        return surface
+
+    def release(self, owner, size):
+        count, total = self.owners[owner]
+        self.owners[owner] = (count - 1, total - size)
+        self.current -= size
+
+    def mark_load(self, level):
+        history = self.loads.setdefault(level, [])
+        history.append(self.current)
+        del history[:-(self.LEAK_LOADS + 1)]
+        if len(history) > self.LEAK_LOADS and all(a < b for a, b in zip(history, history[1:])):
+            self.leaks[level] = list(history)
+        else:
+            self.leaks.pop(level, None)
+
+    def live_surfaces(self):
+        return sum(count for count, _ in self.owners.values())
+
+    def dump(self):
+        lines = [f"{'owner':<12} {'surfaces':>9} {'KiB':>10}"]
+        for owner, (count, total) in sorted(self.owners.items(), key=lambda item: -item[1][1]):
+            if count:
+                lines.append(f"{owner:<12} {count:>9} {total / 1024:>10.1f}")
+        lines.append(f"{'total':<12} {self.live_surfaces():>9} {self.current / 1024:>10.1f}"
+                     f"  (peak {self.peak / 1024:.1f} KiB)")
+        for level, history in sorted(self.leaks.items()):
+            lines.append(f"level {level}: live surface memory grew on each of the last {self.LEAK_LOADS} loads: "
+                         + " -> ".join(f"{size / 1024:.1f}" for size in history) + " KiB")
+        return "\n".join(lines)
+
+surface_tracker = SurfaceTracker()
+
+def tracked_surface(owner, size, flags=0):
+    return surface_tracker.track(owner, pygame.Surface(size, flags))
+
+# The game always draws to a SCREEN_WIDTH x SCREEN_HEIGHT logical surface. With a
+# scale (0 picks the largest integer factor that fits the desktop) or vsync, the
+# display is opened with SCALED so SDL's renderer stretches it to the window
+# instead of the CPU. pygame turns integer scaling off for SCALED|FULLSCREEN, so
+# an integer-scaled fullscreen display is opened windowed and then switched to
+# desktop fullscreen, where SDL letterboxes it at the largest factor that fits.
+def init_display(scale=None, vsync=False, fullscreen=False):
+    global screen
+    size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+    if scale is None and not vsync and not fullscreen:
+        screen = pygame.display.set_mode(size)
+    else:
+        integer_fullscreen = fullscreen and scale is not None
+        flags = pygame.SCALED | (pygame.FULLSCREEN if fullscreen and not integer_fullscreen else 0)
+        try:
+            screen = pygame.display.set_mode(size, flags, vsync=int(vsync))
+        except pygame.error:
+            screen = pygame.display.set_mode(size, flags)
+        if scale is not None:
+            try:
+                from pygame._sdl2.video import Window
+                window = Window.from_display_module()
+                if integer_fullscreen:
+                    window.set_fullscreen(desktop=True)
+                elif scale:
+                    window.size = (SCREEN_WIDTH * scale, SCREEN_HEIGHT * scale)
+            except (ImportError, pygame.error):
+                pass
+    pygame.display.set_caption("Super Daniel Jaccosy")
+    return screen
+
 class Camera:
     def __init__(self, width, height):
         self.camera = pygame.Rect(0, 0, width, height)
@@ -42,6 +147,15 @@ class Camera:
     def apply_rect(self, rect):
         return rect.move(self.camera.topleft)
 
+    def view(self):
+        return pygame.Rect(-self.camera.x, -self.camera.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def blit_list(self, sprites):
+        ox, oy = self.camera.topleft
+        view = self.view()
+        return [(sprite.image, (sprite.rect.x + ox, sprite.rect.y + oy))
+                for sprite in sprites if view.colliderect(sprite.rect)]
+
     def update(self, target):
         x = -target.rect.centerx + SCREEN_WIDTH // 2
         y = -target.rect.centery + SCREEN_HEIGHT // 2
@@ -51,12 +165,135 @@ class Camera:
         y = max(-(self.height - SCREEN_HEIGHT), y)
         self.camera = pygame.Rect(x, y, self.width, self.height)
 
+# Sweep-and-prune on x, rebuilt every frame. Each body is only tested against the
+# still-open bodies of tags it can interact with. Static coins are not swept here;
+# they are looked up in their own store's x index.
+class Broadphase:
+    def __init__(self):
+        self.bodies = []
+
+    def clear(self):
+        self.bodies = []
+
+    def add(self, tag, sprite):
+        self.bodies.append((sprite.rect.left, tag, sprite))
+
+    def add_group(self, tag, group):
+        for sprite in group:
+            self.bodies.append((sprite.rect.left, tag, sprite))
+
+    def pairs(self, rules):
+        partners = {}
+        for a, b in rules:
+            partners.setdefault(a, set()).add(b)
+            partners.setdefault(b, set()).add(a)
+
+        self.bodies.sort(key=lambda body: body[0])
+        active = {tag: [] for tag in partners}
+        found = []
+        for left, tag, sprite in self.bodies:
+            if tag not in partners:
+                continue
+            for other_tag in partners[tag]:
+                still_open = [s for s in active[other_tag] if s.rect.right > left]
+                active[other_tag] = still_open
+                for other in still_open:
+                    if sprite.rect.colliderect(other.rect):
+                        if (tag, other_tag) in rules:
+                            found.append((tag, sprite, other_tag, other))
+                        else:
+                            found.append((other_tag, other, tag, sprite))
+            active[tag].append(sprite)
+        return found
+
+# Swept AABB: time of impact in [0, 1) of rect moving by (dx, dy) into target and
+# the normal of the face that was hit, or None if they do not touch this step.
+def sweep_aabb(rect, dx, dy, target):
+    if not dx and not dy:
+        return None
+    if dx > 0:
+        x_entry, x_exit = target.left - rect.right, target.right - rect.left
+    else:
+        x_entry, x_exit = target.right - rect.left, target.left - rect.right
+    if dy > 0:
+        y_entry, y_exit = target.top - rect.bottom, target.bottom - rect.top
+    else:
+        y_entry, y_exit = target.bottom - rect.top, target.top - rect.bottom
+
+    if dx:
+        tx_entry, tx_exit = x_entry / dx, x_exit / dx
+    elif rect.left < target.right and rect.right > target.left:
+        tx_entry, tx_exit = -math.inf, math.inf
+    else:
+        return None
+    if dy:
+        ty_entry, ty_exit = y_entry / dy, y_exit / dy
+    elif rect.top < target.bottom and rect.bottom > target.top:
+        ty_entry, ty_exit = -math.inf, math.inf
+    else:
+        return None
+
+    entry = max(tx_entry, ty_entry)
+    exit_time = min(tx_exit, ty_exit)
+    if entry >= 1 or entry > exit_time or exit_time <= 0:
+        return None
+    # A negative entry means the boxes already overlap; push back out at t=0.
+    if tx_entry > ty_entry:
+        return max(entry, 0), (-1 if dx > 0 else 1), 0
+    return max(entry, 0), 0, (-1 if dy > 0 else 1)
+
+# Distance and final speed after dt frames of v = min(v + g, max_speed); y += v,
+# stepped a frame at a time so a large dt falls exactly as far as the same number
+# of dt=1 frames (and as the analyzer's jump arcs assume).
+def fall(vel_y, gravity, max_speed, dt):
+    if dt == 1:
+        vel_y += gravity
+        if vel_y > max_speed:
+            vel_y = max_speed
+        return vel_y, vel_y
+    dy = 0
+    while dt > 0:
+        step = min(dt, 1)
+        vel_y = min(vel_y + gravity * step, max_speed)
+        dy += vel_y * step
+        dt -= step
+    return dy, vel_y
+
+def move_and_collide(rect, dx, dy, platforms):
+    hit = None
+    # Rect.move truncates fractional steps, so pad the swept bounds by a pixel.
+    for platform in platforms.query(rect.union(rect.move(dx, dy)).inflate(2, 2)):
+        contact = sweep_aabb(rect, dx, dy, platform.rect)
+        if contact and (hit is None or contact[0] < hit[0]):
+            hit = contact + (platform.rect,)
+
+    if hit is None:
+        rect.x += dx
+        rect.y += dy
+        return None
+
+    toi, nx, ny, target = hit
+    if nx:
+        rect.y += dy * toi
+        if nx < 0:
+            rect.right = target.left
+        else:
+            rect.left = target.right
+    else:
+        rect.x += dx * toi
+        if ny < 0:
+            rect.bottom = target.top
+        else:
+            rect.top = target.bottom
+    return toi, nx, ny
+
 class Player(pygame.sprite.Sprite):
     def __init__(self, x, y):
         super().__init__()
         self.width = 24
         self.height = 32
         self.image = self.create_sprite()
+        self.flipped_image = None
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -65,6 +302,8 @@ class Player(pygame.sprite.Sprite):
         self.speed = 5
         self.jump_power = -15
         self.gravity = 0.8
+        self.max_fall_speed = 15
+        self.boost_multiplier = 1.5
         self.on_ground = False
         self.facing_right = True
         self.can_double_jump = False
@@ -77,7 +316,7 @@ class Player(pygame.sprite.Sprite):
         self.animation_timer = 0
 
     def create_sprite(self):
-        surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        surface = tracked_surface("Player", (self.width, self.height), pygame.SRCALPHA)
         pygame.draw.rect(surface, (255, 200, 150), (4, 0, 16, 10))
         pygame.draw.rect(surface, (100, 50, 0), (4, 0, 16, 6))
         pygame.draw.rect(surface, BLACK, (8, 6, 3, 3))
@@ -88,18 +327,19 @@ class Player(pygame.sprite.Sprite):
         pygame.draw.rect(surface, BROWN, (14, 28, 6, 4))
         return surface
 
-    def update(self, platforms, enemies, powerups, coins, flag):
-        keys = pygame.key.get_pressed()
+    def update(self, platforms, dt=1, keys=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
         
         base_speed = self.speed
         if self.speed_boost:
-            base_speed = self.speed * 1.5
-            self.speed_boost_timer -= 1
+            base_speed = self.speed * self.boost_multiplier
+            self.speed_boost_timer -= dt
             if self.speed_boost_timer <= 0:
                 self.speed_boost = False
 
         if self.invincible:
-            self.invincible_timer -= 1
+            self.invincible_timer -= dt
             if self.invincible_timer <= 0:
                 self.invincible = False
 
@@ -111,16 +351,15 @@ class Player(pygame.sprite.Sprite):
             self.vel_x = base_speed
             self.facing_right = True
 
-        self.vel_y += self.gravity
-        if self.vel_y > 15:
-            self.vel_y = 15
+        dy, self.vel_y = fall(self.vel_y, self.gravity, self.max_fall_speed, dt)
 
-        self.rect.x += self.vel_x
-        self.check_collision_x(platforms)
+        move_and_collide(self.rect, self.vel_x * dt, 0, platforms)
 
-        self.rect.y += self.vel_y
         self.on_ground = False
-        self.check_collision_y(platforms)
+        hit = move_and_collide(self.rect, 0, dy, platforms)
+        if hit:
+            self.vel_y = 0
+            self.on_ground = hit[2] < 0
 
         if self.on_ground:
             self.has_double_jumped = False
@@ -128,34 +367,45 @@ class Player(pygame.sprite.Sprite):
         if self.rect.y > 800:
             return "died"
 
-        for enemy in enemies:
-            if self.rect.colliderect(enemy.rect):
-                if self.vel_y > 0 and self.rect.bottom <= enemy.rect.top + 20:
-                    if enemy.enemy_type == "spike":
+        return None
+
+    def interact(self, contacts):
+        events = []
+        falling = self.vel_y > 0
+        for kind, other in sorted(contacts, key=lambda c: CONTACT_ORDER[c[0]]):
+            if kind == "enemy":
+                if falling and self.rect.bottom <= other.rect.top + 20:
+                    if other.enemy_type == "spike":
                         if not self.invincible:
-                            return "hit"
+                            events.append("hit")
                     else:
-                        enemy.kill()
+                        other.kill()
                         self.vel_y = self.jump_power * 0.6
-                        return "enemy_killed"
+                        events.append("enemy_killed")
                 elif not self.invincible:
-                    return "hit"
-
-        for powerup in powerups:
-            if self.rect.colliderect(powerup.rect):
-                effect = powerup.collect()
-                powerup.kill()
-                return effect
-
-        for coin in coins:
-            if self.rect.colliderect(coin.rect):
-                coin.kill()
-                return "coin_collected"
-
-        if flag and self.rect.colliderect(flag.rect):
-            return "level_complete"
-
-        return None
+                    events.append("hit")
+            elif kind == "powerup":
+                events.append(other.collect())
+                other.kill()
+            elif kind == "coin":
+                other.kill()
+                events.append("coin_collected")
+            elif kind == "flag":
+                events.append("level_complete")
+            elif kind == "projectile":
+                if not self.invincible:
+                    other.kill()
+                    events.append("hit")
+            elif kind == "boss":
+                if falling and self.rect.bottom < other.rect.centery:
+                    if other.take_damage():
+                        self.vel_y = self.jump_power
+                        events.append("boss_hit")
+                        if other.health <= 0:
+                            events.append("boss_defeated")
+                elif not self.invincible:
+                    events.append("hit")
+        return events
 
     def jump(self):
         if self.on_ground:
@@ -165,71 +415,245 @@ class Player(pygame.sprite.Sprite):
             self.vel_y = self.jump_power
             self.has_double_jumped = True
 
-    def check_collision_x(self, platforms):
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_x > 0:
-                    self.rect.right = platform.rect.left
-                elif self.vel_x < 0:
-                    self.rect.left = platform.rect.right
-
-    def check_collision_y(self, platforms):
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.vel_y = 0
-                    self.on_ground = True
-                elif self.vel_y < 0:
-                    self.rect.top = platform.rect.bottom
-                    self.vel_y = 0
-
-    def draw(self, surface, camera):
+    def frame_image(self):
         if self.invincible and (self.invincible_timer // 5) % 2 == 0:
-            return
-        pos = camera.apply(self)
+            return None
         if self.facing_right:
-            surface.blit(self.image, pos)
-        else:
-            surface.blit(pygame.transform.flip(self.image, True, False), pos)
+            return self.image
+        if self.flipped_image is None:
+            self.flipped_image = surface_tracker.track("Player", pygame.transform.flip(self.image, True, False))
+        return self.flipped_image
+
+# Static entities live in packed arrays (position, size, kind) instead of one
+# Sprite, Rect and Surface each. Iterating or querying the store hands out small
+# handles; subclasses decide how their entities are drawn.
+class EntityStore:
+    handle = None
+    kinds = ()
+
+    def __init__(self):
+        self.empty()
+
+    def empty(self):
+        self.xs = array("i")
+        self.ys = array("i")
+        self.widths = array("i")
+        self.heights = array("i")
+        self.kind_ids = array("B")
+        self.alive_flags = array("B")
+        self.live = 0
+        self.max_width = 0
+        self.order = None
+        self.sorted_xs = None
+
+    def add(self, x, y, width, height, kind):
+        self.xs.append(int(x))
+        self.ys.append(int(y))
+        self.widths.append(int(width))
+        self.heights.append(int(height))
+        self.kind_ids.append(self.kinds.index(kind))
+        self.alive_flags.append(1)
+        self.live += 1
+        self.max_width = max(self.max_width, int(width))
+        self.order = None
+        return len(self.xs) - 1
+
+    def kill(self, index):
+        if self.alive_flags[index]:
+            self.alive_flags[index] = 0
+            self.live -= 1
+
+    def rect(self, index):
+        return pygame.Rect(self.xs[index], self.ys[index], self.widths[index], self.heights[index])
+
+    def kind(self, index):
+        return self.kinds[self.kind_ids[index]]
+
+    def update(self, dt=1):
+        pass
+
+    def __len__(self):
+        return self.live
+
+    def __iter__(self):
+        alive = self.alive_flags
+        for index in range(len(alive)):
+            if alive[index]:
+                yield self.handle(self, index)
+
+    def overlapping(self, rect):
+        if self.order is None:
+            self.order = array("i", sorted(range(len(self.xs)), key=self.xs.__getitem__))
+            self.sorted_xs = array("i", (self.xs[i] for i in self.order))
+        lo = bisect_right(self.sorted_xs, rect.left - self.max_width)
+        hi = bisect_left(self.sorted_xs, rect.right)
+        return [index for index in self.order[lo:hi]
+                if self.alive_flags[index]
+                and self.xs[index] + self.widths[index] > rect.left
+                and self.ys[index] < rect.bottom
+                and self.ys[index] + self.heights[index] > rect.top]
+
+    def query(self, rect):
+        return [self.handle(self, index) for index in self.overlapping(rect)]
+
+class EntityHandle:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def rect(self):
+        return self.store.rect(self.index)
+
+    def alive(self):
+        return bool(self.store.alive_flags[self.index])
+
+    def kill(self):
+        self.store.kill(self.index)
+
+class Platform(EntityHandle):
+    __slots__ = ()
+
+    @property
+    def platform_type(self):
+        return self.store.kind(self.index)
+
+# Platforms keep their exact rects for collision, but are also binned into a
+# TILE_SIZE grid so collision queries only look at the cells they cover. Every
+# platform is drawn from one shared atlas of TILE_SIZE tiles laid from its
+# top-left corner, so pixel memory is per tile type instead of per platform size.
+class Platforms(EntityStore):
+    handle = Platform
+    kinds = ("ground", "brick", "stone")
+    tiles = ("grass", "ground", "brick", "stone")
+    run = 4
+    atlas = None
 
-class Platform(pygame.sprite.Sprite):
-    def __init__(self, x, y, width, height, platform_type="ground"):
+    def __init__(self):
+        # Both survive empty(): a reset rebuilds the level with the same
+        # platforms, so its grid and strip layouts are reused, not rebuilt.
+        self.grids = {}
+        self.layouts = {}
         super().__init__()
-        self.image = pygame.Surface((width, height))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.platform_type = platform_type
-        self.draw_platform()
-
-    def draw_platform(self):
-        if self.platform_type == "ground":
-            self.image.fill(BROWN)
-            pygame.draw.rect(self.image, GREEN, (0, 0, self.rect.width, 8))
-            for i in range(0, self.rect.width, 16):
-                pygame.draw.rect(self.image, DARK_GREEN, (i + 4, 2, 8, 4))
-        elif self.platform_type == "brick":
-            self.image.fill((180, 100, 50))
-            for row in range(0, self.rect.height, 16):
+
+    def empty(self):
+        super().empty()
+        self.rects = []
+        self.cells = None
+
+    def add(self, x, y, width, height, platform_type="ground"):
+        index = super().add(x, y, width, height, platform_type)
+        self.rects.append(super().rect(index))
+        self.cells = None
+        return index
+
+    def grid(self):
+        key = self.xs.tobytes() + self.ys.tobytes() + self.widths.tobytes() + self.heights.tobytes()
+        cells = self.grids.get(key)
+        if cells is None:
+            cells = self.grids[key] = {}
+            for index, rect in enumerate(self.rects):
+                for cx in range(rect.left // TILE_SIZE, (rect.right - 1) // TILE_SIZE + 1):
+                    for cy in range(rect.top // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE + 1):
+                        cells.setdefault((cx, cy), []).append(index)
+        return cells
+
+    # Platforms never move, so handles share the stored Rect instead of building one per access.
+    def rect(self, index):
+        return self.rects[index]
+
+    def overlapping(self, rect):
+        cells = self.cells
+        if cells is None:
+            cells = self.cells = self.grid()
+        left, top = rect.left // TILE_SIZE, rect.top // TILE_SIZE
+        right, bottom = (rect.right - 1) // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE
+        if left == right and top == bottom:
+            candidates = cells.get((left, top), ())
+        else:
+            candidates = set()
+            for cx in range(left, right + 1):
+                for cy in range(top, bottom + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        candidates.update(bucket)
+        rects, alive = self.rects, self.alive_flags
+        return [index for index in candidates if alive[index] and rect.colliderect(rects[index])]
+
+    # Each atlas row is one tile type repeated run times, so a platform row is
+    # drawn a strip at a time rather than one blit per tile.
+    @classmethod
+    def tile_atlas(cls):
+        if cls.atlas is None:
+            cls.atlas = tracked_surface("Platforms", (TILE_SIZE * cls.run, TILE_SIZE * len(cls.tiles)))
+            for row, tile in enumerate(cls.tiles):
+                cls.draw_tile(cls.atlas.subsurface((0, row * TILE_SIZE, TILE_SIZE * cls.run, TILE_SIZE)), tile)
+        return cls.atlas
+
+    @staticmethod
+    def draw_tile(image, tile):
+        width, height = image.get_size()
+        if tile in ("grass", "ground"):
+            image.fill(BROWN)
+            if tile == "grass":
+                pygame.draw.rect(image, GREEN, (0, 0, width, 8))
+                for i in range(0, width, 16):
+                    pygame.draw.rect(image, DARK_GREEN, (i + 4, 2, 8, 4))
+        elif tile == "brick":
+            image.fill((180, 100, 50))
+            for row in range(0, height, 16):
                 offset = 16 if (row // 16) % 2 else 0
-                for col in range(-offset, self.rect.width, 32):
-                    pygame.draw.rect(self.image, (140, 70, 30), (col, row, 30, 14))
-                    pygame.draw.rect(self.image, (200, 120, 70), (col + 2, row + 2, 26, 2))
-        elif self.platform_type == "stone":
-            self.image.fill(GRAY)
-            for i in range(0, self.rect.width, 32):
-                for j in range(0, self.rect.height, 32):
-                    pygame.draw.rect(self.image, DARK_GRAY, (i, j, 30, 30))
-                    pygame.draw.rect(self.image, (180, 180, 180), (i + 2, j + 2, 26, 2))
+                for col in range(-offset, width, 32):
+                    pygame.draw.rect(image, (140, 70, 30), (col, row, 30, 14))
+                    pygame.draw.rect(image, (200, 120, 70), (col + 2, row + 2, 26, 2))
+        elif tile == "stone":
+            image.fill(GRAY)
+            for i in range(0, width, 32):
+                pygame.draw.rect(image, DARK_GRAY, (i, 0, 30, 30))
+                pygame.draw.rect(image, (180, 180, 180), (i + 2, 2, 26, 2))
+
+    # (x, y, atlas area) for each strip of a platform shape, relative to its
+    # top-left corner. Strips on the right and bottom edges are cropped.
+    def layout(self, kind, width, height):
+        key = (kind, width, height)
+        strips = self.layouts.get(key)
+        if strips is None:
+            row = self.tiles.index(kind) * TILE_SIZE
+            step = TILE_SIZE * self.run
+            strips = self.layouts[key] = [
+                # Ground platforms only have grass along their top row.
+                (tx, ty, pygame.Rect(0, 0 if kind == "ground" and ty == 0 else row,
+                                     min(step, width - tx), min(TILE_SIZE, height - ty)))
+                for ty in range(0, height, TILE_SIZE) for tx in range(0, width, step)]
+        return strips
+
+    def blit_list(self, view, offset):
+        atlas = self.tile_atlas()
+        ox, oy = offset
+        blits = []
+        # A screen-sized query covers hundreds of cells, so the view goes through
+        # the x-sorted index instead of the grid.
+        for index in EntityStore.overlapping(self, view):
+            x, y = self.xs[index], self.ys[index]
+            left, right = view.left - x - TILE_SIZE * self.run, view.right - x
+            sx, sy = x + ox, y + oy
+            strips = self.layout(self.kind(index), self.widths[index], self.heights[index])
+            blits += [(atlas, (sx + tx, sy + ty), area) for tx, ty, area in strips if left < tx < right]
+        return blits
 
 class Enemy(pygame.sprite.Sprite):
+    sprites = {}
+
     def __init__(self, x, y, enemy_type="goomba"):
         super().__init__()
         self.enemy_type = enemy_type
         self.width = 28
         self.height = 28
-        self.image = self.create_sprite()
+        if enemy_type not in Enemy.sprites:
+            Enemy.sprites[enemy_type] = self.create_sprite()
+        self.image = Enemy.sprites[enemy_type]
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -242,7 +666,7 @@ class Enemy(pygame.sprite.Sprite):
         self.animation_timer = 0
 
     def create_sprite(self):
-        surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        surface = tracked_surface("Enemy", (self.width, self.height), pygame.SRCALPHA)
         if self.enemy_type == "goomba":
             pygame.draw.ellipse(surface, (139, 90, 43), (2, 0, 24, 16))
             pygame.draw.ellipse(surface, (180, 120, 60), (4, 2, 20, 12))
@@ -267,23 +691,21 @@ class Enemy(pygame.sprite.Sprite):
             pygame.draw.circle(surface, RED, (18, 14), 1)
         return surface
 
-    def update(self, platforms):
-        self.vel_y += self.gravity
-        if self.vel_y > 10:
-            self.vel_y = 10
+    def update(self, platforms, dt=1):
+        dy, self.vel_y = fall(self.vel_y, self.gravity, 10, dt)
 
         if self.enemy_type != "spike":
-            self.rect.x += self.vel_x * self.direction
+            self.rect.x += self.vel_x * self.direction * dt
 
             if self.rect.x <= self.patrol_start or self.rect.x >= self.patrol_end:
                 self.direction *= -1
 
-        self.rect.y += self.vel_y
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.vel_y = 0
+        # Only falling bodies land; flying ones pass through platforms as before.
+        if dy > 0:
+            if move_and_collide(self.rect, 0, dy, platforms):
+                self.vel_y = 0
+        else:
+            self.rect.y += dy
 
 class Boss(pygame.sprite.Sprite):
     def __init__(self, x, y):
@@ -310,7 +732,7 @@ class Boss(pygame.sprite.Sprite):
         self.patrol_end = x + 100
 
     def create_sprite(self):
-        surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        surface = tracked_surface("Boss", (self.width, self.height), pygame.SRCALPHA)
         pygame.draw.rect(surface, (80, 0, 0), (8, 20, 48, 50))
         pygame.draw.rect(surface, (120, 0, 0), (12, 24, 40, 42))
         pygame.draw.ellipse(surface, (60, 0, 0), (8, 0, 48, 30))
@@ -326,36 +748,34 @@ class Boss(pygame.sprite.Sprite):
         pygame.draw.rect(surface, (40, 0, 0), (36, 65, 16, 15))
         return surface
 
-    def update(self, platforms, player):
+    def update(self, platforms, player, dt=1):
         if self.invincible:
-            self.invincible_timer -= 1
+            self.invincible_timer -= dt
             if self.invincible_timer <= 0:
                 self.invincible = False
 
-        self.vel_y += self.gravity
-        if self.vel_y > 10:
-            self.vel_y = 10
+        dy, self.vel_y = fall(self.vel_y, self.gravity, 10, dt)
 
         speed = self.vel_x * (1.5 if self.phase == 2 else 1)
-        self.rect.x += speed * self.direction
+        self.rect.x += speed * self.direction * dt
 
         if self.rect.x <= self.patrol_start or self.rect.x >= self.patrol_end:
             self.direction *= -1
 
-        self.rect.y += self.vel_y
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.vel_y = 0
+        # Only falling bodies land; flying ones pass through platforms as before.
+        if dy > 0:
+            if move_and_collide(self.rect, 0, dy, platforms):
+                self.vel_y = 0
+        else:
+            self.rect.y += dy
 
-        self.attack_timer += 1
+        self.attack_timer += dt
         cooldown = self.attack_cooldown if self.phase == 1 else self.attack_cooldown // 2
         if self.attack_timer >= cooldown:
             self.attack_timer = 0
             self.shoot_projectile(player)
 
-        self.projectiles.update()
+        self.projectiles.update(platforms, dt)
         
         if self.health <= self.max_health // 2:
             self.phase = 2
@@ -373,67 +793,73 @@ class Boss(pygame.sprite.Sprite):
             return True
         return False
 
-    def draw(self, surface, camera):
+    def frame_image(self):
         if self.invincible and (self.invincible_timer // 3) % 2 == 0:
-            return
-        pos = camera.apply(self)
-        surface.blit(self.image, pos)
-        health_bar_width = 60
-        health_ratio = self.health / self.max_health
-        pygame.draw.rect(surface, RED, (pos.x + 2, pos.y - 15, health_bar_width, 8))
-        pygame.draw.rect(surface, GREEN, (pos.x + 2, pos.y - 15, health_bar_width * health_ratio, 8))
-        pygame.draw.rect(surface, BLACK, (pos.x + 2, pos.y - 15, health_bar_width, 8), 2)
+            return None
+        return self.image
 
 class Projectile(pygame.sprite.Sprite):
+    sprite = None
+
     def __init__(self, x, y, direction):
         super().__init__()
-        self.image = pygame.Surface((16, 16), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, RED, (8, 8), 8)
-        pygame.draw.circle(self.image, ORANGE, (8, 8), 5)
-        pygame.draw.circle(self.image, YELLOW, (8, 8), 2)
+        if Projectile.sprite is None:
+            Projectile.sprite = self.create_sprite()
+        self.image = Projectile.sprite
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
         self.vel_x = 6 * direction
         self.lifetime = 180
 
-    def update(self):
-        self.rect.x += self.vel_x
-        self.lifetime -= 1
-        if self.lifetime <= 0:
+    def create_sprite(self):
+        surface = tracked_surface("Projectile", (16, 16), pygame.SRCALPHA)
+        pygame.draw.circle(surface, RED, (8, 8), 8)
+        pygame.draw.circle(surface, ORANGE, (8, 8), 5)
+        pygame.draw.circle(surface, YELLOW, (8, 8), 2)
+        return surface
+
+    def update(self, platforms, dt=1):
+        self.lifetime -= dt
+        if move_and_collide(self.rect, self.vel_x * dt, 0, platforms) or self.lifetime <= 0:
             self.kill()
 
 class Powerup(pygame.sprite.Sprite):
+    sprites = {}
+
     def __init__(self, x, y, powerup_type):
         super().__init__()
         self.powerup_type = powerup_type
-        self.image = pygame.Surface((24, 24), pygame.SRCALPHA)
+        if powerup_type not in Powerup.sprites:
+            Powerup.sprites[powerup_type] = self.create_sprite()
+        self.image = Powerup.sprites[powerup_type]
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
         self.bob_offset = 0
         self.bob_direction = 1
-        self.draw_powerup()
 
-    def draw_powerup(self):
+    def create_sprite(self):
+        surface = tracked_surface("Powerup", (24, 24), pygame.SRCALPHA)
         if self.powerup_type == "double_jump":
-            pygame.draw.rect(self.image, BLUE, (4, 4, 16, 16))
-            pygame.draw.polygon(self.image, WHITE, [(12, 6), (18, 14), (12, 11), (6, 14)])
-            pygame.draw.polygon(self.image, WHITE, [(12, 10), (18, 18), (12, 15), (6, 18)])
+            pygame.draw.rect(surface, BLUE, (4, 4, 16, 16))
+            pygame.draw.polygon(surface, WHITE, [(12, 6), (18, 14), (12, 11), (6, 14)])
+            pygame.draw.polygon(surface, WHITE, [(12, 10), (18, 18), (12, 15), (6, 18)])
         elif self.powerup_type == "extra_life":
-            pygame.draw.circle(self.image, RED, (12, 12), 10)
-            pygame.draw.circle(self.image, PINK, (9, 9), 4)
-            pygame.draw.circle(self.image, PINK, (15, 9), 4)
-            pygame.draw.polygon(self.image, RED, [(12, 20), (4, 12), (12, 14), (20, 12)])
+            pygame.draw.circle(surface, RED, (12, 12), 10)
+            pygame.draw.circle(surface, PINK, (9, 9), 4)
+            pygame.draw.circle(surface, PINK, (15, 9), 4)
+            pygame.draw.polygon(surface, RED, [(12, 20), (4, 12), (12, 14), (20, 12)])
         elif self.powerup_type == "speed":
-            pygame.draw.rect(self.image, YELLOW, (4, 4, 16, 16))
-            pygame.draw.polygon(self.image, ORANGE, [(8, 4), (16, 12), (8, 12), (12, 20), (4, 12), (8, 12)])
+            pygame.draw.rect(surface, YELLOW, (4, 4, 16, 16))
+            pygame.draw.polygon(surface, ORANGE, [(8, 4), (16, 12), (8, 12), (12, 20), (4, 12), (8, 12)])
+        return surface
 
-    def update(self):
-        self.bob_offset += 0.1 * self.bob_direction
+    def update(self, dt=1):
+        self.bob_offset += 0.1 * self.bob_direction * dt
         if abs(self.bob_offset) > 3:
             self.bob_direction *= -1
-        self.rect.y += self.bob_direction * 0.5
+        self.rect.y += self.bob_direction * 0.5 * dt
 
     def collect(self):
         return self.powerup_type
@@ -441,7 +867,7 @@ class Powerup(pygame.sprite.Sprite):
 class Flag(pygame.sprite.Sprite):
     def __init__(self, x, y):
         super().__init__()
-        self.image = pygame.Surface((32, 128), pygame.SRCALPHA)
+        self.image = tracked_surface("Flag", (32, 128), pygame.SRCALPHA)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -450,26 +876,470 @@ class Flag(pygame.sprite.Sprite):
         pygame.draw.polygon(self.image, DARK_GREEN, [(18, 15), (18, 45), (5, 30)])
         pygame.draw.circle(self.image, GOLD, (16, 5), 5)
 
-class Coin(pygame.sprite.Sprite):
-    def __init__(self, x, y):
+class Coin(EntityHandle):
+    __slots__ = ()
+
+    @property
+    def image(self):
+        return self.store.image(self.index)
+
+class Coins(EntityStore):
+    handle = Coin
+    kinds = ("coin",)
+
+    def __init__(self):
         super().__init__()
-        self.image = pygame.Surface((16, 16), pygame.SRCALPHA)
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
         self.animation_frame = 0
-        self.draw_coin()
 
-    def draw_coin(self):
-        pygame.draw.circle(self.image, GOLD, (8, 8), 7)
-        pygame.draw.circle(self.image, YELLOW, (8, 8), 5)
-        pygame.draw.circle(self.image, GOLD, (8, 8), 3)
+    def empty(self):
+        super().empty()
+        self.images = {}
+
+    def add(self, x, y):
+        return super().add(x, y, 16, 16, "coin")
+
+    def image(self, index):
+        key = (self.kind_ids[index], self.widths[index], self.heights[index])
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = self.create_image(self.kind(index), key[1], key[2])
+        return image
+
+    def create_image(self, kind, width, height):
+        image = tracked_surface("Coins", (width, height), pygame.SRCALPHA)
+        pygame.draw.circle(image, GOLD, (8, 8), 7)
+        pygame.draw.circle(image, YELLOW, (8, 8), 5)
+        pygame.draw.circle(image, GOLD, (8, 8), 3)
+        return image
+
+    def blit_list(self, view, offset):
+        ox, oy = offset
+        return [(self.image(index), (self.xs[index] + ox, self.ys[index] + oy))
+                for index in self.overlapping(view)]
+
+    def update(self, dt=1):
+        self.animation_frame += dt
+
+# Ability modes used by the level analyzer, as bit positions in an edge mask.
+MODE_PLAIN, MODE_BOOST, MODE_DOUBLE_JUMP, MODE_BOTH = range(4)
+
+# Memoized jump arcs for one set of player physics. Each mode's arc is stepped
+# with the same per-frame integration as Player.update (and every possible
+# double-jump frame), then folded into a table of the furthest horizontal
+# distance at which the player's feet can come down at each rise in pixels.
+class JumpArcs:
+    def __init__(self, player, margin=0.95, headroom=2):
+        self.speed = player.speed
+        self.boost_multiplier = player.boost_multiplier
+        self.jump_power = player.jump_power
+        self.gravity = player.gravity
+        self.max_fall_speed = player.max_fall_speed
+        self.width = player.width
+        self.height = player.height
+        self.margin = margin
+        self.headroom = headroom
+        self.tables = {}
+
+    def table(self, mode):
+        if mode not in self.tables:
+            speed = self.speed * (self.boost_multiplier if mode in (MODE_BOOST, MODE_BOTH) else 1)
+            if mode in (MODE_DOUBLE_JUMP, MODE_BOTH):
+                triggers = range(1, self.fall_frames())
+            else:
+                triggers = [None]
+            landing = {}
+            for trigger in triggers:
+                self.trace(speed, trigger, landing)
+            self.tables[mode] = landing
+        return self.tables[mode]
+
+    def fall_frames(self):
+        frames, y, vel_y = 0, 0, self.jump_power
+        while y < SCREEN_HEIGHT * 2:
+            vel_y = min(vel_y + self.gravity, self.max_fall_speed)
+            y += vel_y
+            frames += 1
+        return frames
+
+    def trace(self, speed, trigger, landing):
+        x, y, vel_y, frame = 0, 0, self.jump_power, 0
+        while y < SCREEN_HEIGHT * 2:
+            frame += 1
+            if frame == trigger:
+                vel_y = self.jump_power
+            vel_y = min(vel_y + self.gravity, self.max_fall_speed)
+            previous = y
+            y += vel_y
+            x += speed
+            if vel_y > 0:
+                for rise in range(math.ceil(-y), math.floor(-previous) + 1):
+                    if landing.get(rise, -1) < x:
+                        landing[rise] = x
+
+    def reach(self, rise, mode=MODE_PLAIN):
+        distance = self.table(mode).get(math.ceil(rise) + self.headroom)
+        if distance is None:
+            return None
+        return distance * self.margin + self.width - 1
+
+    def max_rise(self, mode=MODE_PLAIN):
+        return max(self.table(mode)) - self.headroom
+
+    def max_reach(self, mode=MODE_PLAIN):
+        return max(self.table(mode).values()) * self.margin + self.width - 1
+
+# Worker-side state for LevelAnalyzer, installed once per process.
+_analysis = None
+
+def _init_analysis(state):
+    global _analysis
+    _analysis = state
+
+def _analyze_platforms(bounds):
+    xs, ys, widths, heights, order, sorted_xs, max_width, arcs, pickups = _analysis
+    pickup_order = sorted(range(len(pickups)), key=lambda k: pickups[k][0])
+    pickup_xs = [pickups[k][0] for k in pickup_order]
+    pickup_width = max((p[2] for p in pickups), default=0)
+    max_reach = arcs.max_reach(MODE_BOTH)
+    max_rise = arcs.max_rise(MODE_BOTH)
+    modes = range(4)
+    edges = []
+    reachable_pickups = []
+    for i in range(*bounds):
+        left, top, right = xs[i], ys[i], xs[i] + widths[i]
+        out = []
+        lo = bisect_right(sorted_xs, left - max_reach - max_width)
+        hi = bisect_left(sorted_xs, right + max_reach)
+        for j in order[lo:hi]:
+            if j == i or ys[j] < top - max_rise:
+                continue
+            gap = max(0, xs[j] - right, left - xs[j] - widths[j])
+            mask = 0
+            for mode in modes:
+                reach = arcs.reach(top - ys[j], mode)
+                if reach is not None and gap <= reach:
+                    mask |= 1 << mode
+            if mask:
+                out.append((j, mask))
+        edges.append(out)
+
+        found = []
+        lo = bisect_right(pickup_xs, left - max_reach - pickup_width)
+        hi = bisect_left(pickup_xs, right + max_reach)
+        for k in pickup_order[lo:hi]:
+            px, py, pw, ph = pickups[k][:4]
+            if py > top:
+                continue
+            rise = max(0, top - arcs.height - (py + ph) + 1)
+            gap = max(0, px - right, left - px - pw)
+            mask = 0
+            for mode in modes:
+                reach = arcs.reach(rise, mode)
+                if reach is not None and gap <= reach:
+                    mask |= 1 << mode
+            if mask:
+                found.append((k, mask))
+        reachable_pickups.append(found)
+    return bounds[0], edges, reachable_pickups
+
+class LevelReport:
+    def __init__(self, flag_reachable, route, unreachable_powerups, unreachable_coins):
+        self.flag_reachable = flag_reachable
+        self.route = route
+        self.unreachable_powerups = unreachable_powerups
+        self.unreachable_coins = unreachable_coins
+
+    def __str__(self):
+        lines = [f"flag reachable: {'yes' if self.flag_reachable else 'NO'}"
+                 + (f" ({len(self.route)} platforms)" if self.flag_reachable else "")]
+        for x, y, powerup_type in self.unreachable_powerups:
+            lines.append(f"unreachable powerup {powerup_type} at ({x}, {y})")
+        if self.unreachable_coins:
+            lines.append(f"unreachable coins: {len(self.unreachable_coins)} "
+                         + ", ".join(f"({x}, {y})" for x, y in self.unreachable_coins[:10])
+                         + (" ..." if len(self.unreachable_coins) > 10 else ""))
+        return "\n".join(lines)
+
+# Proves a route to the flag by searching a platform reachability graph built
+# from the player's real jump physics, tracking double jump (kept for the rest
+# of the level) and speed boost (assumed to last for the next jump only).
+# Edge building is split across worker processes for large levels. Ceilings
+# and mid-air enemies are not modelled.
+class LevelAnalyzer:
+    def __init__(self, game, workers=None, chunk=256, arcs=None):
+        self.game = game
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.chunk = chunk
+        self.arcs = arcs or JumpArcs(game.player)
+
+    def analyze(self):
+        game = self.game
+        platforms = game.platforms
+        count = len(platforms.xs)
+        xs, ys = list(platforms.xs), list(platforms.ys)
+        widths, heights = list(platforms.widths), list(platforms.heights)
+        order = sorted(range(count), key=xs.__getitem__)
+        sorted_xs = [xs[i] for i in order]
+
+        pickups = [(p.rect.x, p.rect.y, p.rect.width, p.rect.height, p.powerup_type) for p in game.powerups]
+        pickups += [(c.rect.x, c.rect.y, 16, 16, "coin") for c in game.coins]
+        if game.flag:
+            pickups.append((game.flag.rect.x, game.flag.rect.y, game.flag.rect.width, game.flag.rect.height, "flag"))
+
+        for mode in range(4):
+            self.arcs.table(mode)
+        state = (xs, ys, widths, heights, order, sorted_xs, platforms.max_width, self.arcs, pickups)
+        chunks = [(lo, min(lo + self.chunk, count)) for lo in range(0, count, self.chunk)]
+        edges = [None] * count
+        reachable_pickups = [None] * count
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(self.workers, initializer=_init_analysis, initargs=(state,)) as pool:
+                results = list(pool.map(_analyze_platforms, chunks))
+        else:
+            _init_analysis(state)
+            results = [_analyze_platforms(bounds) for bounds in chunks]
+        for lo, chunk_edges, chunk_pickups in results:
+            edges[lo:lo + len(chunk_edges)] = chunk_edges
+            reachable_pickups[lo:lo + len(chunk_pickups)] = chunk_pickups
+
+        player = game.player.rect
+        below = [i for i in range(count)
+                 if xs[i] < player.right and xs[i] + widths[i] > player.left and ys[i] >= player.bottom]
+        if not below:
+            return LevelReport(False, [], [p[:2] + (p[4],) for p in pickups if p[4] not in ("coin", "flag")],
+                               [p[:2] for p in pickups if p[4] == "coin"])
+
+        start = (min(below, key=ys.__getitem__), False, False)
+        parents = {start: None}
+        frontier = [start]
+        collected = set()
+        flag_state = None
+        while frontier:
+            node = frontier.pop()
+            platform, double_jump, boost = node
+            mode = (MODE_DOUBLE_JUMP if double_jump else MODE_PLAIN) + (MODE_BOOST if boost else 0)
+            bit = 1 << mode
+            next_nodes = []
+            for k, mask in reachable_pickups[platform]:
+                if mask & bit:
+                    collected.add(k)
+                    kind = pickups[k][4]
+                    if kind == "flag" and flag_state is None:
+                        flag_state = node
+                    elif kind == "double_jump":
+                        next_nodes.append((platform, True, boost))
+                    elif kind == "speed":
+                        next_nodes.append((platform, double_jump, True))
+            for j, mask in edges[platform]:
+                if mask & bit:
+                    next_nodes.append((j, double_jump, False))
+            for other in next_nodes:
+                if other not in parents:
+                    parents[other] = node
+                    frontier.append(other)
+
+        route = []
+        node = flag_state
+        while node is not None:
+            if not route or route[-1] != (xs[node[0]], ys[node[0]]):
+                route.append((xs[node[0]], ys[node[0]]))
+            node = parents[node]
+        route.reverse()
+
+        unreachable_powerups = [p[:2] + (p[4],) for k, p in enumerate(pickups)
+                                if k not in collected and p[4] not in ("coin", "flag")]
+        unreachable_coins = [p[:2] for k, p in enumerate(pickups) if k not in collected and p[4] == "coin"]
+        return LevelReport(flag_state is not None, route, unreachable_powerups, unreachable_coins)
+
+# Seeded level generator for stress levels of any width. Gaps and steps are kept
+# inside the player's jump envelope, and each level is checked for a route to
+# the flag before it is used.
+class LevelGenerator:
+    def __init__(self, seed=0, width=8000, enemies=None, coins=None, powerups=None, workers=1):
+        self.seed = seed
+        self.workers = workers
+        self.width = max(width, 1200)
+        self.enemies = self.width // 250 if enemies is None else enemies
+        self.coins = self.width // 100 if coins is None else coins
+        self.powerups = self.width // 1000 if powerups is None else powerups
+        self.arcs = JumpArcs(Player(100, 400))
+        # A build is deterministic per (seed, level), so each level is only
+        # analyzed the first time it is built, not on every reset after a death.
+        self.validated = set()
+
+    def build(self, game, level_num=1):
+        rng = random.Random(f"{self.seed}-{level_num}")
+        arcs = self.arcs
+        max_rise = arcs.max_rise()
+        flat_reach = arcs.reach(0)
+
+        grounds = []
+        x = 0
+        end = self.width - 300
+        while x < end:
+            width = rng.randint(150, 600) if x else rng.randint(400, 700)
+            width = min(width, end - x) if end - x > 150 else end - x
+            grounds.append((x, width))
+            game.platforms.add(x, 550, width, 50, "ground")
+            x += width + rng.randint(40, int(flat_reach * 0.6))
+        game.platforms.add(x, 550, self.width - x, 50, "ground")
+        grounds.append((x, self.width - x))
+
+        floating = []
+        x = 250
+        y = 550
+        while x < self.width - 400:
+            width = rng.randint(50, 150)
+            if y <= 300 or rng.random() < 0.2:
+                y = rng.randint(440, 470)
+            else:
+                y = max(250, min(470, y - rng.randint(-80, int(max_rise * 0.6))))
+            floating.append((x, y, width))
+            game.platforms.add(x, y, width, 20, rng.choice(("brick", "stone")))
+            x += width + rng.randint(30, int(flat_reach * 0.5))
+
+        spawnable = [(x, width) for x, width in grounds if x + width - 28 >= 400]
+        for _ in range(self.enemies):
+            kind = rng.choice(("goomba", "goomba", "spike", "flying"))
+            if kind == "flying":
+                enemy = Enemy(rng.randint(400, self.width - 400), rng.randint(250, 400), kind)
+                enemy.gravity = 0
+            else:
+                # Keep clear of the spawn, and pick x before Enemy sets its patrol from it.
+                ground_x, ground_width = rng.choice(spawnable)
+                left = max(ground_x, 400)
+                enemy = Enemy(rng.randint(left, max(left, ground_x + ground_width - 28)), 520, kind)
+            game.enemies.add(enemy)
+
+        for _ in range(self.powerups):
+            px, py, pw = rng.choice(floating)
+            game.powerups.add(Powerup(px + pw // 2 - 12, py - 40,
+                                      rng.choice(("double_jump", "extra_life", "speed"))))
+
+        for _ in range(self.coins):
+            px, py, pw = rng.choice(floating)
+            game.coins.add(px + rng.randint(0, max(0, pw - 16)), py - rng.randint(30, 90))
+
+        game.flag = Flag(self.width - 200, 422)
+        game.player = Player(100, 400)
+        key = (self.seed, level_num)
+        if key not in self.validated:
+            if not LevelAnalyzer(game, workers=self.workers, arcs=arcs).analyze().flag_reachable:
+                raise ValueError(f"generated level {level_num} (seed {self.seed}) has no route to the flag")
+            self.validated.add(key)
+
+# Tracks how long each frame's work took against the 1/FPS budget and steps
+# optional work down one level at a time while frames run over, then back up
+# once there is steady headroom:
+#   1 - simplified parallax clouds
+#   2 - no coin and powerup animation updates
+#   3 - HUD redrawn every HUD_SLOW_INTERVAL frames instead of every frame
+class FrameGovernor:
+    MAX_LEVEL = 3
+    HUD_SLOW_INTERVAL = 10
+
+    def __init__(self, fps=FPS, busy_loop=False):
+        self.fps = fps
+        self.budget = 1000 / fps
+        self.busy_loop = busy_loop
+        self.level = 0
+        self.frame_ms = 0
+        self.average_ms = 0
+        self.over = 0
+        self.under = 0
+
+    # work_ms is measured around update and draw only. The clock's raw time also
+    # covers display.flip, which blocks until vblank with vsync on and would read
+    # as a full budget every frame.
+    def tick(self, clock, work_ms):
+        if self.busy_loop:
+            clock.tick_busy_loop(self.fps)
+        else:
+            clock.tick(self.fps)
+        self.record(work_ms)
+
+    def record(self, frame_ms):
+        self.frame_ms = frame_ms
+        self.average_ms += (frame_ms - self.average_ms) * 0.1
+        if self.average_ms > self.budget * 0.95:
+            self.over += 1
+            self.under = 0
+            if self.over >= 15 and self.level < self.MAX_LEVEL:
+                self.level += 1
+                self.over = 0
+        elif self.average_ms < self.budget * 0.6:
+            self.under += 1
+            self.over = 0
+            if self.under >= 120 and self.level > 0:
+                self.level -= 1
+                self.under = 0
+        else:
+            self.over = 0
+            self.under = 0
+
+    def parallax_detail(self):
+        return self.level < 1
+
+    def animate(self):
+        return self.level < 2
+
+    def hud_interval(self):
+        return self.HUD_SLOW_INTERVAL if self.level >= 3 else 1
+
+# Save states are a fixed header followed by packed records: the player, every
+# enemy and powerup the level was built with (alive or not), one alive byte per
+# coin, the boss and its live projectiles. Static geometry is not stored; it is
+# rebuilt from the level number when a state from another level is loaded.
+SAVE_MAGIC = b"SDJS"
+SAVE_VERSION = 1
+SAVE_HEADER = struct.Struct("<4sHHiiIII")
+SAVE_PLAYER = struct.Struct("<iiffffB")
+SAVE_ENEMY = struct.Struct("<?iifb")
+SAVE_POWERUP = struct.Struct("<?iifb")
+SAVE_BOSS = struct.Struct("<?iifbbfB?fiiH")
+SAVE_PROJECTILE = struct.Struct("<iiff")
+PLAYER_FLAGS = ("on_ground", "facing_right", "can_double_jump", "has_double_jumped", "speed_boost", "invincible")
+
+# Everything Game.render needs to draw one frame, captured as positions and shared
+# images so the simulation can move on while the frame is being drawn.
+RenderSnapshot = namedtuple("RenderSnapshot", "camera_x detailed layers flag boss projectiles player hud")
+
+# Draws snapshots on a worker thread. Blits release the GIL, so frame N is drawn
+# while the main thread simulates frame N+1; the display itself is only
+# flipped from the main thread.
+class RenderThread:
+    def __init__(self, game):
+        self.game = game
+        self.pending = queue.Queue(maxsize=1)
+        self.done = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.loop, name="render", daemon=True)
+        self.thread.start()
+
+    def loop(self):
+        while True:
+            snapshot = self.pending.get()
+            if snapshot is None:
+                return
+            try:
+                self.game.render(snapshot)
+                self.done.put(None)
+            except Exception as error:
+                self.done.put(error)
 
-    def update(self):
-        self.animation_frame += 1
+    def submit(self, snapshot):
+        self.pending.put(snapshot)
+
+    def wait(self):
+        error = self.done.get()
+        if error is not None:
+            raise error
+
+    def stop(self):
+        self.pending.put(None)
+        self.thread.join()
 
 class Game:
-    def __init__(self):
+    def __init__(self, generator=None):
         self.state = "menu"
         self.lives = 5
         self.score = 0
@@ -477,13 +1347,22 @@ class Game:
         self.total_levels = 6
         self.font = pygame.font.Font(None, 36)
         self.title_font = pygame.font.Font(None, 72)
+        self.small_font = pygame.font.Font(None, 24)
+        self.broadphase = Broadphase()
+        self.generator = generator
+        self.governor = FrameGovernor()
+        self.hud = tracked_surface("Game", (SCREEN_WIDTH, 40))
+        self.hud_age = None
+        self.show_profiler = False
+        self.quick_save = None
+        self.platforms = Platforms()
+        self.enemies = pygame.sprite.Group()
+        self.powerups = pygame.sprite.Group()
+        self.coins = Coins()
+        self.level_boss = None
         self.reset_level()
 
     def reset_level(self):
-        self.platforms = pygame.sprite.Group()
-        self.enemies = pygame.sprite.Group()
-        self.powerups = pygame.sprite.Group()
-        self.coins = pygame.sprite.Group()
         self.flag = None
         self.boss = None
         self.level_width = 2400
@@ -491,6 +1370,7 @@ class Game:
         
         self.load_level(self.current_level)
         self.camera = Camera(self.level_width, self.level_height)
+        surface_tracker.mark_load(self.current_level)
 
     def reset_game(self):
         self.lives = 5
@@ -499,13 +1379,20 @@ class Game:
         self.reset_level()
 
     def load_level(self, level_num):
+        # Emptying (rather than replacing) the groups breaks the sprite <-> group
+        # reference cycles, so the previous level is freed straight away.
         self.platforms.empty()
         self.enemies.empty()
         self.powerups.empty()
         self.coins.empty()
+        if self.level_boss:
+            self.level_boss.projectiles.empty()
         self.boss = None
 
-        if level_num == 1:
+        if self.generator is not None:
+            self.level_width = self.generator.width
+            self.generator.build(self, level_num)
+        elif level_num == 1:
             self.level_width = 2400
             self.create_level_1()
         elif level_num == 2:
@@ -525,21 +1412,24 @@ class Game:
             self.create_level_6()
 
         self.player = Player(100, 400)
+        self.enemy_roster = list(self.enemies)
+        self.powerup_roster = list(self.powerups)
+        self.level_boss = self.boss
 
     def create_level_1(self):
-        self.platforms.add(Platform(0, 550, 600, 50, "ground"))
-        self.platforms.add(Platform(700, 550, 400, 50, "ground"))
-        self.platforms.add(Platform(1200, 550, 600, 50, "ground"))
-        self.platforms.add(Platform(1900, 550, 500, 50, "ground"))
-
-        self.platforms.add(Platform(300, 450, 100, 20, "brick"))
-        self.platforms.add(Platform(500, 380, 100, 20, "brick"))
-        self.platforms.add(Platform(750, 420, 80, 20, "brick"))
-        self.platforms.add(Platform(900, 350, 100, 20, "brick"))
-        self.platforms.add(Platform(1100, 280, 80, 20, "brick"))
-        self.platforms.add(Platform(1350, 400, 120, 20, "brick"))
-        self.platforms.add(Platform(1550, 320, 100, 20, "brick"))
-        self.platforms.add(Platform(1750, 400, 100, 20, "brick"))
+        self.platforms.add(0, 550, 600, 50, "ground")
+        self.platforms.add(700, 550, 400, 50, "ground")
+        self.platforms.add(1200, 550, 600, 50, "ground")
+        self.platforms.add(1900, 550, 500, 50, "ground")
+
+        self.platforms.add(300, 450, 100, 20, "brick")
+        self.platforms.add(500, 380, 100, 20, "brick")
+        self.platforms.add(750, 420, 80, 20, "brick")
+        self.platforms.add(900, 350, 100, 20, "brick")
+        self.platforms.add(1100, 280, 80, 20, "brick")
+        self.platforms.add(1350, 400, 120, 20, "brick")
+        self.platforms.add(1550, 320, 100, 20, "brick")
+        self.platforms.add(1750, 400, 100, 20, "brick")
 
         self.enemies.add(Enemy(400, 520, "goomba"))
         self.enemies.add(Enemy(800, 520, "goomba"))
@@ -549,29 +1439,29 @@ class Game:
         self.powerups.add(Powerup(1150, 240, "extra_life"))
 
         for x in [320, 520, 920, 1380, 1580]:
-            self.coins.add(Coin(x, 300))
+            self.coins.add(x, 300)
 
         self.flag = Flag(2200, 422)
 
     def create_level_2(self):
-        self.platforms.add(Platform(0, 550, 400, 50, "ground"))
-        self.platforms.add(Platform(500, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(900, 550, 400, 50, "ground"))
-        self.platforms.add(Platform(1400, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(1800, 550, 400, 50, "ground"))
-        self.platforms.add(Platform(2300, 550, 500, 50, "ground"))
-
-        self.platforms.add(Platform(200, 450, 80, 20, "stone"))
-        self.platforms.add(Platform(350, 380, 80, 20, "stone"))
-        self.platforms.add(Platform(550, 320, 100, 20, "stone"))
-        self.platforms.add(Platform(750, 380, 80, 20, "stone"))
-        self.platforms.add(Platform(950, 300, 100, 20, "stone"))
-        self.platforms.add(Platform(1150, 250, 80, 20, "stone"))
-        self.platforms.add(Platform(1350, 350, 100, 20, "stone"))
-        self.platforms.add(Platform(1500, 280, 80, 20, "stone"))
-        self.platforms.add(Platform(1700, 400, 100, 20, "stone"))
-        self.platforms.add(Platform(1950, 320, 120, 20, "stone"))
-        self.platforms.add(Platform(2150, 380, 100, 20, "stone"))
+        self.platforms.add(0, 550, 400, 50, "ground")
+        self.platforms.add(500, 550, 300, 50, "ground")
+        self.platforms.add(900, 550, 400, 50, "ground")
+        self.platforms.add(1400, 550, 300, 50, "ground")
+        self.platforms.add(1800, 550, 400, 50, "ground")
+        self.platforms.add(2300, 550, 500, 50, "ground")
+
+        self.platforms.add(200, 450, 80, 20, "stone")
+        self.platforms.add(350, 380, 80, 20, "stone")
+        self.platforms.add(550, 320, 100, 20, "stone")
+        self.platforms.add(750, 380, 80, 20, "stone")
+        self.platforms.add(950, 300, 100, 20, "stone")
+        self.platforms.add(1150, 250, 80, 20, "stone")
+        self.platforms.add(1350, 350, 100, 20, "stone")
+        self.platforms.add(1500, 280, 80, 20, "stone")
+        self.platforms.add(1700, 400, 100, 20, "stone")
+        self.platforms.add(1950, 320, 120, 20, "stone")
+        self.platforms.add(2150, 380, 100, 20, "stone")
 
         self.enemies.add(Enemy(300, 520, "goomba"))
         self.enemies.add(Enemy(600, 520, "goomba"))
@@ -586,32 +1476,32 @@ class Game:
         self.flag = Flag(2600, 422)
 
     def create_level_3(self):
-        self.platforms.add(Platform(0, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(400, 550, 200, 50, "ground"))
-        self.platforms.add(Platform(700, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(1100, 550, 200, 50, "ground"))
-        self.platforms.add(Platform(1400, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(1800, 550, 200, 50, "ground"))
-        self.platforms.add(Platform(2100, 550, 300, 50, "ground"))
-        self.platforms.add(Platform(2500, 550, 200, 50, "ground"))
-        self.platforms.add(Platform(2800, 550, 400, 50, "ground"))
-
-        self.platforms.add(Platform(150, 470, 60, 20, "brick"))
-        self.platforms.add(Platform(280, 400, 60, 20, "brick"))
-        self.platforms.add(Platform(450, 330, 60, 20, "brick"))
-        self.platforms.add(Platform(600, 400, 60, 20, "brick"))
-        self.platforms.add(Platform(800, 450, 80, 20, "brick"))
-        self.platforms.add(Platform(950, 370, 60, 20, "brick"))
-        self.platforms.add(Platform(1050, 300, 60, 20, "brick"))
-        self.platforms.add(Platform(1200, 400, 80, 20, "brick"))
-        self.platforms.add(Platform(1450, 350, 60, 20, "brick"))
-        self.platforms.add(Platform(1600, 280, 60, 20, "brick"))
-        self.platforms.add(Platform(1750, 350, 60, 20, "brick"))
-        self.platforms.add(Platform(1900, 420, 80, 20, "brick"))
-        self.platforms.add(Platform(2150, 350, 60, 20, "brick"))
-        self.platforms.add(Platform(2300, 280, 60, 20, "brick"))
-        self.platforms.add(Platform(2450, 350, 60, 20, "brick"))
-        self.platforms.add(Platform(2600, 420, 80, 20, "brick"))
+        self.platforms.add(0, 550, 300, 50, "ground")
+        self.platforms.add(400, 550, 200, 50, "ground")
+        self.platforms.add(700, 550, 300, 50, "ground")
+        self.platforms.add(1100, 550, 200, 50, "ground")
+        self.platforms.add(1400, 550, 300, 50, "ground")
+        self.platforms.add(1800, 550, 200, 50, "ground")
+        self.platforms.add(2100, 550, 300, 50, "ground")
+        self.platforms.add(2500, 550, 200, 50, "ground")
+        self.platforms.add(2800, 550, 400, 50, "ground")
+
+        self.platforms.add(150, 470, 60, 20, "brick")
+        self.platforms.add(280, 400, 60, 20, "brick")
+        self.platforms.add(450, 330, 60, 20, "brick")
+        self.platforms.add(600, 400, 60, 20, "brick")
+        self.platforms.add(800, 450, 80, 20, "brick")
+        self.platforms.add(950, 370, 60, 20, "brick")
+        self.platforms.add(1050, 300, 60, 20, "brick")
+        self.platforms.add(1200, 400, 80, 20, "brick")
+        self.platforms.add(1450, 350, 60, 20, "brick")
+        self.platforms.add(1600, 280, 60, 20, "brick")
+        self.platforms.add(1750, 350, 60, 20, "brick")
+        self.platforms.add(1900, 420, 80, 20, "brick")
+        self.platforms.add(2150, 350, 60, 20, "brick")
+        self.platforms.add(2300, 280, 60, 20, "brick")
+        self.platforms.add(2450, 350, 60, 20, "brick")
+        self.platforms.add(2600, 420, 80, 20, "brick")
 
         for x in [200, 500, 900, 1250, 1550, 1950, 2350, 2650]:
             self.enemies.add(Enemy(x, 520, "goomba"))
@@ -626,18 +1516,18 @@ class Game:
         self.flag = Flag(3000, 422)
 
     def create_level_4(self):
-        self.platforms.add(Platform(0, 550, 250, 50, "ground"))
+        self.platforms.add(0, 550, 250, 50, "ground")
         for i in range(8):
-            self.platforms.add(Platform(350 + i * 400, 550, 150, 50, "ground"))
-        self.platforms.add(Platform(3400, 550, 200, 50, "ground"))
+            self.platforms.add(350 + i * 400, 550, 150, 50, "ground")
+        self.platforms.add(3400, 550, 200, 50, "ground")
 
         heights = [480, 420, 360, 300, 360, 420, 360, 300, 250, 300, 360, 420]
         for i, h in enumerate(heights):
-            self.platforms.add(Platform(200 + i * 260, h, 50, 20, "stone"))
+            self.platforms.add(200 + i * 260, h, 50, 20, "stone")
 
-        self.platforms.add(Platform(1000, 200, 100, 20, "stone"))
-        self.platforms.add(Platform(1800, 180, 100, 20, "stone"))
-        self.platforms.add(Platform(2600, 200, 100, 20, "stone"))
+        self.platforms.add(1000, 200, 100, 20, "stone")
+        self.platforms.add(1800, 180, 100, 20, "stone")
+        self.platforms.add(2600, 200, 100, 20, "stone")
 
         for x in [400, 750, 1150, 1550, 1950, 2350, 2750]:
             self.enemies.add(Enemy(x, 520, "goomba"))
@@ -653,16 +1543,16 @@ class Game:
         self.flag = Flag(3450, 422)
 
     def create_level_5(self):
-        self.platforms.add(Platform(0, 550, 200, 50, "ground"))
+        self.platforms.add(0, 550, 200, 50, "ground")
         for i in range(10):
-            self.platforms.add(Platform(300 + i * 370, 550, 120, 50, "ground"))
-        self.platforms.add(Platform(3800, 550, 200, 50, "ground"))
+            self.platforms.add(300 + i * 370, 550, 120, 50, "ground")
+        self.platforms.add(3800, 550, 200, 50, "ground")
 
         tower_positions = [400, 900, 1500, 2100, 2700, 3300]
         for pos in tower_positions:
             for h in range(3):
-                self.platforms.add(Platform(pos, 450 - h * 80, 80, 20, "brick"))
-            self.platforms.add(Platform(pos - 60, 250, 200, 20, "brick"))
+                self.platforms.add(pos, 450 - h * 80, 80, 20, "brick")
+            self.platforms.add(pos - 60, 250, 200, 20, "brick")
 
         for x in [350, 700, 1100, 1550, 1900, 2200, 2600, 2900, 3200, 3600]:
             self.enemies.add(Enemy(x, 520, "goomba"))
@@ -682,16 +1572,16 @@ class Game:
         self.flag = Flag(3900, 422)
 
     def create_level_6(self):
-        self.platforms.add(Platform(0, 550, 2000, 50, "stone"))
+        self.platforms.add(0, 550, 2000, 50, "stone")
         
-        self.platforms.add(Platform(100, 450, 150, 20, "brick"))
-        self.platforms.add(Platform(350, 380, 100, 20, "brick"))
-        self.platforms.add(Platform(550, 320, 100, 20, "brick"))
-        self.platforms.add(Platform(750, 400, 100, 20, "brick"))
-        self.platforms.add(Platform(1000, 350, 150, 20, "brick"))
-        self.platforms.add(Platform(1250, 420, 100, 20, "brick"))
-        self.platforms.add(Platform(1450, 350, 150, 20, "brick"))
-        self.platforms.add(Platform(1700, 400, 100, 20, "brick"))
+        self.platforms.add(100, 450, 150, 20, "brick")
+        self.platforms.add(350, 380, 100, 20, "brick")
+        self.platforms.add(550, 320, 100, 20, "brick")
+        self.platforms.add(750, 400, 100, 20, "brick")
+        self.platforms.add(1000, 350, 150, 20, "brick")
+        self.platforms.add(1250, 420, 100, 20, "brick")
+        self.platforms.add(1450, 350, 150, 20, "brick")
+        self.platforms.add(1700, 400, 100, 20, "brick")
 
         self.boss = Boss(1600, 470)
         self.boss.patrol_start = 1200
@@ -707,19 +1597,27 @@ class Game:
 
         self.flag = Flag(1900, 422)
 
-    def run(self):
+    def run(self, pipelined=False):
+        renderer = RenderThread(self) if pipelined else None
         running = True
         while running:
+            started = time.perf_counter()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
                 if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3:
+                        self.show_profiler = not self.show_profiler
                     if self.state == "menu":
                         if event.key == pygame.K_RETURN:
                             self.state = "playing"
                     elif self.state == "playing":
                         if event.key == pygame.K_SPACE or event.key == pygame.K_UP or event.key == pygame.K_w:
                             self.player.jump()
+                        elif event.key == pygame.K_F5:
+                            self.quick_save = self.save_state()
+                        elif event.key == pygame.K_F9 and self.quick_save:
+                            self.load_state(self.quick_save)
                     elif self.state == "game_over":
                         if event.key == pygame.K_RETURN:
                             self.reset_game()
@@ -732,156 +1630,335 @@ class Game:
             if self.state == "menu":
                 self.draw_menu()
             elif self.state == "playing":
-                self.update()
-                self.draw()
+                if renderer:
+                    renderer.submit(self.snapshot())
+                    self.update()
+                    renderer.wait()
+                else:
+                    self.update()
+                    self.draw()
             elif self.state == "game_over":
                 self.draw_game_over()
             elif self.state == "victory":
                 self.draw_victory()
 
+            if self.show_profiler:
+                self.draw_profiler()
+
+            work_ms = (time.perf_counter() - started) * 1000
             pygame.display.flip()
-            clock.tick(FPS)
+            self.governor.tick(clock, work_ms)
 
+        if renderer:
+            renderer.stop()
         pygame.quit()
         sys.exit()
 
-    def update(self):
-        result = self.player.update(self.platforms, self.enemies, self.powerups, self.coins, self.flag)
-
-        if result == "double_jump":
-            self.player.can_double_jump = True
-        elif result == "extra_life":
-            self.lives += 1
-            self.score += 500
-        elif result == "speed":
-            self.player.speed_boost = True
-            self.player.speed_boost_timer = 300
-        elif result == "enemy_killed":
-            self.score += 100
-        elif result == "coin_collected":
-            self.score += 50
-        elif result == "hit" or result == "died":
-            self.lives -= 1
-            self.score = max(0, self.score - 500)
-            if self.lives <= 0:
-                self.state = "game_over"
-            else:
-                self.reset_level()
-                self.player.invincible = True
-                self.player.invincible_timer = 120
-                return
-        elif result == "level_complete":
-            if self.current_level == 6 and self.boss is not None:
-                pass  # Do not complete level if boss is still alive in level 6
-            else:
-                self.score += 1000
-                self.current_level += 1
-                if self.current_level > self.total_levels:
-                    self.state = "victory"
-                else:
-                    self.reset_level()
-                    return
+    def save_state(self):
+        player = self.player
+        flags = 0
+        for bit, name in enumerate(PLAYER_FLAGS):
+            if getattr(player, name):
+                flags |= 1 << bit
+        parts = [
+            SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, self.current_level, self.lives, self.score,
+                             len(self.enemy_roster), len(self.powerup_roster), len(self.coins.alive_flags)),
+            SAVE_PLAYER.pack(player.rect.x, player.rect.y, player.vel_x, player.vel_y,
+                             player.speed_boost_timer, player.invincible_timer, flags),
+        ]
+        parts.extend(SAVE_ENEMY.pack(e.alive(), e.rect.x, e.rect.y, e.vel_y, e.direction)
+                     for e in self.enemy_roster)
+        parts.extend(SAVE_POWERUP.pack(p.alive(), p.rect.x, p.rect.y, p.bob_offset, p.bob_direction)
+                     for p in self.powerup_roster)
+        parts.append(self.coins.alive_flags.tobytes())
+
+        boss = self.boss
+        if boss:
+            parts.append(SAVE_BOSS.pack(True, boss.rect.x, boss.rect.y, boss.vel_y, boss.health, boss.direction,
+                                        boss.attack_timer, boss.phase, boss.invincible, boss.invincible_timer,
+                                        boss.patrol_start, boss.patrol_end, len(boss.projectiles)))
+            parts.extend(SAVE_PROJECTILE.pack(p.rect.x, p.rect.y, p.vel_x, p.lifetime) for p in boss.projectiles)
+        else:
+            parts.append(SAVE_BOSS.pack(False, 0, 0, 0, 0, 0, 0, 0, False, 0, 0, 0, 0))
+        return b"".join(parts)
+
+    def load_state(self, blob):
+        view = memoryview(blob)
+        magic, version, level, lives, score, enemies, powerups, coins = SAVE_HEADER.unpack_from(view)
+        if magic != SAVE_MAGIC or version != SAVE_VERSION:
+            raise ValueError(f"not a version {SAVE_VERSION} save state")
+        if level != self.current_level or enemies != len(self.enemy_roster) or powerups != len(self.powerup_roster):
+            self.current_level = level
+            self.reset_level()
+        if enemies != len(self.enemy_roster) or powerups != len(self.powerup_roster) \
+                or coins != len(self.coins.alive_flags):
+            raise ValueError(f"save state does not match level {level}")
+        self.lives = lives
+        self.score = score
+        self.state = "playing"
+        offset = SAVE_HEADER.size
+
+        player = self.player
+        x, y, player.vel_x, player.vel_y, player.speed_boost_timer, player.invincible_timer, flags = \
+            SAVE_PLAYER.unpack_from(view, offset)
+        player.rect.topleft = (x, y)
+        for bit, name in enumerate(PLAYER_FLAGS):
+            setattr(player, name, bool(flags & (1 << bit)))
+        offset += SAVE_PLAYER.size
+
+        end = offset + SAVE_ENEMY.size * enemies
+        for enemy, (alive, x, y, vel_y, direction) in zip(self.enemy_roster, SAVE_ENEMY.iter_unpack(view[offset:end])):
+            enemy.rect.topleft = (x, y)
+            enemy.vel_y = vel_y
+            enemy.direction = direction
+            if not alive:
+                enemy.kill()
+            elif not enemy.alive():
+                self.enemies.add(enemy)
+        offset = end
+
+        end = offset + SAVE_POWERUP.size * powerups
+        for powerup, (alive, x, y, bob_offset, bob_direction) in zip(self.powerup_roster,
+                                                                    SAVE_POWERUP.iter_unpack(view[offset:end])):
+            powerup.rect.topleft = (x, y)
+            powerup.bob_offset = bob_offset
+            powerup.bob_direction = bob_direction
+            if not alive:
+                powerup.kill()
+            elif not powerup.alive():
+                self.powerups.add(powerup)
+        offset = end
+
+        alive_flags = array("B", view[offset:offset + coins])
+        self.coins.alive_flags = alive_flags
+        self.coins.live = sum(alive_flags)
+        offset += coins
+
+        (present, x, y, vel_y, health, direction, attack_timer, phase, invincible, invincible_timer,
+         patrol_start, patrol_end, projectiles) = SAVE_BOSS.unpack_from(view, offset)
+        offset += SAVE_BOSS.size
+        if not present:
+            self.boss = None
+        else:
+            boss = self.boss = self.level_boss or Boss(x, y)
+            boss.rect.topleft = (x, y)
+            boss.vel_y = vel_y
+            boss.health = health
+            boss.direction = direction
+            boss.attack_timer = attack_timer
+            boss.phase = phase
+            boss.invincible = invincible
+            boss.invincible_timer = invincible_timer
+            boss.patrol_start = patrol_start
+            boss.patrol_end = patrol_end
+            boss.projectiles.empty()
+            end = offset + SAVE_PROJECTILE.size * projectiles
+            for x, y, vel_x, lifetime in SAVE_PROJECTILE.iter_unpack(view[offset:end]):
+                projectile = Projectile(x, y, 1)
+                projectile.vel_x = vel_x
+                projectile.lifetime = lifetime
+                boss.projectiles.add(projectile)
+
+        self.camera.update(self.player)
+
+    def run_headless(self, frames, dt=1):
+        if dt <= 0:
+            raise ValueError(f"dt must be greater than 0, got {dt}")
+        self.state = "playing"
+        steps = 0
+        elapsed = 0
+        while elapsed < frames and self.state == "playing":
+            self.update(dt)
+            elapsed += dt
+            steps += 1
+        return steps
+
+    def update(self, dt=1, keys=None):
+        if self.player.update(self.platforms, dt, keys) == "died":
+            self.handle_events(["died"])
+            return
 
         for enemy in self.enemies:
-            enemy.update(self.platforms)
+            enemy.update(self.platforms, dt)
 
-        for coin in self.coins:
-            coin.update()
+        if self.governor.animate():
+            self.coins.update(dt)
 
         if self.boss:
-            self.boss.update(self.platforms, self.player)
-
-            for proj in list(self.boss.projectiles):
-                if self.player.rect.colliderect(proj.rect) and not self.player.invincible:
-                    proj.kill()
-                    self.lives -= 1
-                    self.score = max(0, self.score - 500)
-                    if self.lives <= 0:
-                        self.state = "game_over"
-                    else:
-                        self.reset_level()
-                        self.player.invincible = True
-                        self.player.invincible_timer = 120
-                        return
-
-            if self.player.rect.colliderect(self.boss.rect):
-                if self.player.vel_y > 0 and self.player.rect.bottom < self.boss.rect.centery:
-                    if self.boss.take_damage():
-                        self.player.vel_y = self.player.jump_power
-                        self.score += 200
-                        if self.boss.health <= 0:
-                            self.boss = None
-                            self.score += 2000
-                elif not self.player.invincible:
-                    self.lives -= 1
-                    self.score = max(0, self.score - 500)
-                    if self.lives <= 0:
-                        self.state = "game_over"
-                    else:
-                        self.reset_level()
-                        self.player.invincible = True
-                        self.player.invincible_timer = 120
-                        return
+            self.boss.update(self.platforms, self.player, dt)
+
+        if self.governor.animate():
+            for powerup in self.powerups:
+                powerup.update(dt)
 
-        for powerup in self.powerups:
-            powerup.update()
+        contacts = self.find_contacts()
+        if self.handle_events(self.player.interact(contacts)):
+            return
 
         self.camera.update(self.player)
 
+    def find_contacts(self):
+        self.broadphase.clear()
+        self.broadphase.add("player", self.player)
+        self.broadphase.add_group("enemy", self.enemies)
+        self.broadphase.add_group("powerup", self.powerups)
+        if self.flag:
+            self.broadphase.add("flag", self.flag)
+        if self.boss:
+            self.broadphase.add("boss", self.boss)
+            self.broadphase.add_group("projectile", self.boss.projectiles)
+        contacts = [(kind, other) for _, _, kind, other in self.broadphase.pairs(PLAYER_CONTACTS)]
+        contacts.extend(("coin", coin) for coin in self.coins.query(self.player.rect))
+        return contacts
+
+    def handle_events(self, events):
+        for event in events:
+            if event == "double_jump":
+                self.player.can_double_jump = True
+            elif event == "extra_life":
+                self.lives += 1
+                self.score += 500
+            elif event == "speed":
+                self.player.speed_boost = True
+                self.player.speed_boost_timer = 300
+            elif event == "enemy_killed":
+                self.score += 100
+            elif event == "coin_collected":
+                self.score += 50
+            elif event == "boss_hit":
+                self.score += 200
+            elif event == "boss_defeated":
+                self.boss = None
+                self.score += 2000
+            elif event == "hit" or event == "died":
+                self.lives -= 1
+                self.score = max(0, self.score - 500)
+                if self.lives <= 0:
+                    self.state = "game_over"
+                else:
+                    self.reset_level()
+                    self.player.invincible = True
+                    self.player.invincible_timer = 120
+                return True
+            elif event == "level_complete":
+                if self.current_level == 6 and self.boss is not None:
+                    pass  # Do not complete level if boss is still alive in level 6
+                else:
+                    self.score += 1000
+                    self.current_level += 1
+                    if self.current_level > self.total_levels:
+                        self.state = "victory"
+                    else:
+                        self.reset_level()
+                    return True
+        return False
+
     def draw(self):
+        self.render(self.snapshot())
+
+    def snapshot(self):
+        camera = self.camera
+        view = camera.view()
+        offset = camera.camera.topleft
+        layers = (
+            self.platforms.blit_list(view, offset),
+            self.coins.blit_list(view, offset),
+            camera.blit_list(self.powerups),
+            camera.blit_list(self.enemies),
+        )
+        flag = (self.flag.image, self.camera.apply(self.flag).topleft) if self.flag else None
+
+        boss = projectiles = None
+        if self.boss:
+            image = self.boss.frame_image()
+            if image:
+                boss = (image, self.camera.apply(self.boss).topleft, self.boss.health / self.boss.max_health)
+            projectiles = camera.blit_list(self.boss.projectiles)
+
+        image = self.player.frame_image()
+        player = (image, self.camera.apply(self.player).topleft) if image else None
+
+        hud = (self.lives, self.score, self.current_level, self.total_levels,
+               self.player.can_double_jump, self.player.speed_boost)
+        return RenderSnapshot(camera.camera.x, self.governor.parallax_detail(), layers, flag, boss,
+                              projectiles, player, hud)
+
+    def render(self, snapshot):
         screen.fill(SKY_BLUE)
 
         for i in range(0, SCREEN_WIDTH, 64):
-            cloud_x = (i - self.camera.camera.x // 4) % (SCREEN_WIDTH + 100) - 50
-            pygame.draw.ellipse(screen, WHITE, (cloud_x, 50, 60, 30))
-            pygame.draw.ellipse(screen, WHITE, (cloud_x + 20, 35, 50, 35))
-            pygame.draw.ellipse(screen, WHITE, (cloud_x + 40, 50, 60, 30))
-
-        for platform in self.platforms:
-            screen.blit(platform.image, self.camera.apply(platform))
+            cloud_x = (i - snapshot.camera_x // 4) % (SCREEN_WIDTH + 100) - 50
+            if snapshot.detailed:
+                pygame.draw.ellipse(screen, WHITE, (cloud_x, 50, 60, 30))
+                pygame.draw.ellipse(screen, WHITE, (cloud_x + 20, 35, 50, 35))
+                pygame.draw.ellipse(screen, WHITE, (cloud_x + 40, 50, 60, 30))
+            else:
+                pygame.draw.rect(screen, WHITE, (cloud_x, 45, 100, 30))
 
-        for coin in self.coins:
-            screen.blit(coin.image, self.camera.apply(coin))
+        for layer in snapshot.layers:
+            screen.blits(layer, False)
 
-        for powerup in self.powerups:
-            screen.blit(powerup.image, self.camera.apply(powerup))
+        if snapshot.flag:
+            screen.blit(*snapshot.flag)
 
-        for enemy in self.enemies:
-            screen.blit(enemy.image, self.camera.apply(enemy))
+        if snapshot.boss:
+            image, (x, y), health_ratio = snapshot.boss
+            screen.blit(image, (x, y))
+            health_bar_width = 60
+            pygame.draw.rect(screen, RED, (x + 2, y - 15, health_bar_width, 8))
+            pygame.draw.rect(screen, GREEN, (x + 2, y - 15, health_bar_width * health_ratio, 8))
+            pygame.draw.rect(screen, BLACK, (x + 2, y - 15, health_bar_width, 8), 2)
+        if snapshot.projectiles:
+            screen.blits(snapshot.projectiles, False)
 
-        if self.flag:
-            screen.blit(self.flag.image, self.camera.apply(self.flag))
+        if snapshot.player:
+            screen.blit(*snapshot.player)
 
-        if self.boss:
-            self.boss.draw(screen, self.camera)
-            for proj in self.boss.projectiles:
-                screen.blit(proj.image, self.camera.apply(proj))
+        self.draw_hud(snapshot.hud)
 
-        self.player.draw(screen, self.camera)
+    def draw_hud(self, values):
+        if self.hud_age is None or self.hud_age + 1 >= self.governor.hud_interval():
+            self.render_hud(*values)
+            self.hud_age = 0
+        else:
+            self.hud_age += 1
+        screen.blit(self.hud, (0, 0))
 
-        self.draw_hud()
+    def render_hud(self, lives, score, level, total_levels, can_double_jump, speed_boost):
+        hud = self.hud
+        hud.fill(BLACK)
 
-    def draw_hud(self):
-        pygame.draw.rect(screen, (0, 0, 0, 128), (0, 0, SCREEN_WIDTH, 40))
-        
-        lives_text = self.font.render(f"Lives: {self.lives}", True, WHITE)
-        screen.blit(lives_text, (20, 10))
+        lives_text = self.font.render(f"Lives: {lives}", True, WHITE)
+        hud.blit(lives_text, (20, 10))
 
-        score_text = self.font.render(f"Score: {self.score}", True, WHITE)
-        screen.blit(score_text, (200, 10))
+        score_text = self.font.render(f"Score: {score}", True, WHITE)
+        hud.blit(score_text, (200, 10))
 
-        level_text = self.font.render(f"Level: {self.current_level}/{self.total_levels}", True, WHITE)
-        screen.blit(level_text, (400, 10))
+        level_text = self.font.render(f"Level: {level}/{total_levels}", True, WHITE)
+        hud.blit(level_text, (400, 10))
 
-        if self.player.can_double_jump:
-            pygame.draw.rect(screen, BLUE, (600, 8, 24, 24))
+        if can_double_jump:
+            pygame.draw.rect(hud, BLUE, (600, 8, 24, 24))
             dj_text = self.font.render("2J", True, WHITE)
-            screen.blit(dj_text, (603, 10))
+            hud.blit(dj_text, (603, 10))
 
-        if self.player.speed_boost:
-            pygame.draw.rect(screen, YELLOW, (640, 8, 24, 24))
+        if speed_boost:
+            pygame.draw.rect(hud, YELLOW, (640, 8, 24, 24))
             sp_text = self.font.render("S", True, BLACK)
-            screen.blit(sp_text, (648, 10))
+            hud.blit(sp_text, (648, 10))
+
+    def draw_profiler(self):
+        governor = self.governor
+        lines = [
+            f"work {governor.frame_ms:.1f} ms (avg {governor.average_ms:.1f} / {governor.budget:.1f})",
+            f"fps {clock.get_fps():.0f}  detail level {governor.level}",
+            f"surfaces {surface_tracker.live_surfaces()}  {surface_tracker.current / 1024:.0f} KiB"
+            f" (peak {surface_tracker.peak / 1024:.0f} KiB)",
+        ]
+        lines += [f"level {level} surface memory growing" for level in sorted(surface_tracker.leaks)]
+        for i, line in enumerate(lines):
+            text = self.small_font.render(line, True, WHITE, BLACK)
+            screen.blit(text, (SCREEN_WIDTH - text.get_width() - 10, 50 + i * 20))
 
     def draw_menu(self):
         screen.fill((50, 50, 100))
@@ -955,7 +2032,51 @@ class Game:
         restart_rect = restart.get_rect(center=(SCREEN_WIDTH // 2, 480))
         screen.blit(restart, restart_rect)
 
+def positive_float(text):
+    value = float(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {text}")
+    return value
+
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser(description="Super Daniel Jaccosy")
+    parser.add_argument("--seed", type=int, help="play procedurally generated levels from this seed")
+    parser.add_argument("--width", type=int, default=8000, help="generated level width in pixels")
+    parser.add_argument("--enemies", type=int, help="enemies per generated level")
+    parser.add_argument("--coins", type=int, help="coins per generated level")
+    parser.add_argument("--headless", type=int, metavar="FRAMES", help="simulate FRAMES frames without drawing and report timing")
+    parser.add_argument("--dt", type=positive_float, default=1, help="frames per simulation step in headless mode")
+    parser.add_argument("--analyze", action="store_true", help="check every level for a route to the flag and exit")
+    parser.add_argument("--scale", type=int, help="integer window scale for the 800x600 view (0 = fit the desktop)")
+    parser.add_argument("--vsync", action="store_true", help="sync presentation to the display refresh")
+    parser.add_argument("--fullscreen", action="store_true", help="stretch the view to fill the screen; with --scale 0, use the largest integer scale and letterbox")
+    parser.add_argument("--precise-pacing", action="store_true", help="pace frames with a busy loop instead of sleeping")
+    parser.add_argument("--surface-report", action="store_true", help="print live surface memory by owner on exit")
+    parser.add_argument("--pipelined", action="store_true", help="draw each frame on a render thread while the next one is simulated")
+    args = parser.parse_args()
+
+    if args.fullscreen and args.scale:
+        parser.error("--fullscreen picks the largest integer scale that fits the screen; use --scale 0 with it")
+    init_display(args.scale, args.vsync, args.fullscreen)
+    generator = None
+    if args.seed is not None:
+        generator = LevelGenerator(args.seed, args.width, args.enemies, args.coins)
+    if args.surface_report:
+        atexit.register(lambda: print(surface_tracker.dump()))
+    game = Game(generator)
+    game.governor.busy_loop = args.precise_pacing
+    if args.analyze:
+        for level in range(1, game.total_levels + 1):
+            game.current_level = level
+            game.reset_level()
+            started = time.perf_counter()
+            report = LevelAnalyzer(game).analyze()
+            print(f"level {level} ({time.perf_counter() - started:.2f}s): {report}")
+    elif args.headless:
+        started = time.perf_counter()
+        steps = game.run_headless(args.headless, args.dt)
+        elapsed = time.perf_counter() - started
+        print(f"{steps} steps in {elapsed:.3f}s ({elapsed / max(steps, 1) * 1000:.3f} ms/step)")
+    else:
+        game.run(args.pipelined)
@@ -0,0 +1,218 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pygame
+
+import main
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+BASELINE_VERSION = 3
+
+# Two-sided 95% Student t critical values by degrees of freedom.
+T_95 = {1: 12.71, 2: 4.30, 3: 3.18, 4: 2.78, 5: 2.57, 6: 2.45, 7: 2.36, 8: 2.31, 9: 2.26,
+        10: 2.23, 15: 2.13, 20: 2.09, 30: 2.04}
+
+# Relative slowdown allowed before a metric fails, on top of the confidence
+# interval. p99 is noisier than p50 on shared runners, so it gets more room.
+THRESHOLDS = {"p50_ms": 0.25, "p99_ms": 0.5, "alloc_kib": 0.2}
+ALLOC_SLACK_KIB = 1.0
+
+
+# Holds right for every frame; step() adds the jumps, so every run sees the
+# same inputs without a keyboard.
+class ScriptedKeys:
+    def __getitem__(self, key):
+        return key in (pygame.K_RIGHT, pygame.K_d)
+
+
+def t_value(samples):
+    df = max(samples - 1, 1)
+    return T_95[max(k for k in T_95 if k <= df)]
+
+
+def interval(values):
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, 0.0
+    return mean, t_value(len(values)) * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def calibrate(rounds=5):
+    # Fixed pure-Python workload used to rescale timings between machines.
+    # The minimum over many rounds skips the slow first passes before the CPU clocks up.
+    best = math.inf
+    for _ in range(rounds):
+        started = time.perf_counter()
+        total = 0
+        for i in range(200000):
+            total += i * i % 7
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def new_game(level):
+    game = main.Game()
+    game.state = "playing"
+    game.current_level = level
+    game.reset_level()
+    return game
+
+
+def step(game, frame, keys, rendered):
+    if frame % 45 == 0:
+        game.player.jump()
+    game.lives = max(game.lives, 5)
+    game.state = "playing"
+    game.update(keys=keys)
+    if rendered:
+        game.draw()
+
+
+# Every frame is timed on its own so p99 is a real frame-time tail; timer and
+# scheduler noise is left to the repeated runs and their confidence interval.
+def time_run(level, rendered, warmup, frames):
+    game = new_game(level)
+    keys = ScriptedKeys()
+    for frame in range(warmup):
+        step(game, frame, keys, rendered)
+    times = []
+    for frame in range(warmup, warmup + frames):
+        started = time.perf_counter()
+        step(game, frame, keys, rendered)
+        times.append((time.perf_counter() - started) * 1000)
+    return percentile(times, 0.5), percentile(times, 0.99)
+
+
+def alloc_run(level, rendered, warmup, frames):
+    game = new_game(level)
+    keys = ScriptedKeys()
+    for frame in range(warmup):
+        step(game, frame, keys, rendered)
+    tracemalloc.start()
+    total = 0
+    for frame in range(warmup, warmup + frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step(game, frame, keys, rendered)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / frames / 1024
+
+
+def measure(levels, runs, warmup, frames, reference):
+    # Shared runners speed up and slow down over seconds, so each run is
+    # normalised by a calibration taken right before it rather than one
+    # taken at startup.
+    results = {}
+    for level in levels:
+        for rendered in (False, True):
+            name = f"level{level}/{'rendered' if rendered else 'headless'}"
+            p50s, p99s = [], []
+            for _ in range(runs):
+                scale = reference / calibrate()
+                p50, p99 = time_run(level, rendered, warmup, frames)
+                p50s.append(p50 * scale)
+                p99s.append(p99 * scale)
+            results[name] = {
+                "p50_ms": interval(p50s),
+                "p99_ms": interval(p99s),
+                "alloc_kib": (alloc_run(level, rendered, warmup, frames), 0.0),
+            }
+            print(f"  measured {name}", file=sys.stderr)
+    return results
+
+
+def compare(baseline, results):
+    failures = []
+    rows = []
+    for name, metrics in sorted(results.items()):
+        expected = baseline["scenarios"].get(name)
+        for metric, (mean, half_width) in metrics.items():
+            if expected is None or metric not in expected:
+                rows.append((name, metric, "-", f"{mean:.3f}", "", "new"))
+                continue
+            base = expected[metric]
+            limit = base * (1 + THRESHOLDS[metric])
+            if metric == "alloc_kib":
+                limit += ALLOC_SLACK_KIB
+            change = (mean - base) / base * 100 if base else 0.0
+            failed = mean - half_width > limit
+            status = "FAIL" if failed else "ok"
+            rows.append((name, metric, f"{base:.3f}", f"{mean:.3f} ±{half_width:.3f}", f"{change:+.1f}%", status))
+            if failed:
+                failures.append(f"{name} {metric}: {mean:.3f} ±{half_width:.3f} vs baseline {base:.3f} "
+                                f"(limit {limit:.3f})")
+
+    widths = [max(len(str(row[i])) for row in rows + [("scenario", "metric", "baseline", "current", "change", "")])
+              for i in range(6)]
+    header = ("scenario", "metric", "baseline", "current", "change", "")
+    for row in [header] + rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Frame-time regression gate for Game.update and Game.draw")
+    parser.add_argument("--update", action="store_true", help="measure and overwrite the stored baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare against")
+    parser.add_argument("--runs", type=int, default=5, help="repeated runs per scenario")
+    parser.add_argument("--warmup", type=int, default=60, help="frames discarded before timing each run")
+    parser.add_argument("--frames", type=int, default=600, help="timed frames per run")
+    parser.add_argument("--levels", type=int, nargs="*", default=list(range(1, 7)), help="levels to run")
+    args = parser.parse_args()
+
+    main.init_display()
+    calibration = calibrate(rounds=20)
+
+    if args.update:
+        results = measure(args.levels, args.runs, args.warmup, args.frames, calibration)
+        baseline = {
+            "version": BASELINE_VERSION,
+            "calibration_ms": round(calibration, 3),
+            "settings": {"runs": args.runs, "warmup": args.warmup, "frames": args.frames},
+            "scenarios": {name: {metric: round(value[0], 4) for metric, value in metrics.items()}
+                          for name, metrics in sorted(results.items())},
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"wrote {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        print(f"{args.baseline} is not a version {BASELINE_VERSION} baseline; rerun with --update")
+        return 2
+
+    # Timings are rescaled by how fast this machine runs the calibration
+    # workload relative to the machine that recorded the baseline.
+    print(f"calibration {calibration:.2f} ms (baseline {baseline['calibration_ms']:.2f} ms)")
+    failures = compare(baseline, measure(args.levels, args.runs, args.warmup, args.frames,
+                                         baseline["calibration_ms"]))
+    if failures:
+        print("\nperformance regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())